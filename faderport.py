@@ -1,11 +1,16 @@
 import collections
-from itertools import cycle, islice
 from collections import namedtuple
+from itertools import islice
 from abc import ABC, abstractmethod
+import logging
+import queue
+import threading
 import time
 
 import mido
 
+log = logging.getLogger(__name__)
+
 Button = namedtuple('Button', ['name', 'press', 'light'])
 Button.__doc__ = "FaderPort button details."
 Button.name.__doc__ = "Button name, usually what's written on the physical button."
@@ -44,7 +49,30 @@ BUTTONS = [
 
 _button_from_name = {x.name: x for x in BUTTONS}
 _button_from_name["Rec Arm"] = _button_from_name["Rec"]  # Add an alias
-_button_from_press = {x.press: x for x in BUTTONS}
+# Also accept lower case names so lookups needn't normalise the case.
+_button_from_name.update({k.lower(): v for k, v in _button_from_name.items()})
+# Indexed directly by MIDI note number, None where no button presses it.
+_button_from_press = [None] * 128
+for _button in BUTTONS:
+    _button_from_press[_button.press] = _button
+del _button
+
+# Pre-built messages to turn each button light on or off, keyed by the
+# button's light value, so lighting a button doesn't build a new message.
+_ON_MSG = {x.light: mido.Message('polytouch', note=x.light, value=1)
+           for x in BUTTONS}
+_OFF_MSG = {x.light: mido.Message('polytouch', note=x.light, value=0)
+            for x in BUTTONS}
+# The same messages in BUTTONS order, for sending to every button in turn.
+_ALL_ON_MSGS = tuple(_ON_MSG[x.light] for x in BUTTONS)
+_ALL_OFF_MSGS = tuple(_OFF_MSG[x.light] for x in BUTTONS)
+
+# Pre-built messages for the MSB (control 0) and LSB (control 32) halves
+# of a fader position in the range 0 to 1023.
+_FADER_MSB_MSG = tuple(mido.Message('control_change', control=0, value=v)
+                       for v in range(1024 >> 7))
+_FADER_LSB_MSG = tuple(mido.Message('control_change', control=32, value=v)
+                       for v in range(128))
 
 
 def button_from_name(name: str) -> Button:
@@ -53,7 +81,7 @@ def button_from_name(name: str) -> Button:
     :param name: The name of a button
     :return: a Button
     """
-    return _button_from_name[name.title()]
+    return _button_from_name.get(name) or _button_from_name[name.lower()]
 
 
 def button_from_press(press: int) -> Button:
@@ -62,7 +90,21 @@ def button_from_press(press: int) -> Button:
     :param press: The value emitted by a pressed button
     :return: a Button
     """
-    return _button_from_press.get(press, None)
+    return _button_from_press[press] if 0 <= press < 128 else None
+
+
+# The buttons, in order, that form the loop used by `FaderPort.chase`.
+_CHASE_SEQ = tuple(button_from_name(name) for name in (
+    'Chan Down', 'Bank', 'Chan Up', 'Output', 'Off', 'Undo',
+    'Loop', 'User', 'Punch', 'Shift', 'Mix', 'Read'))
+
+# For each supported number of chase lights, the chase sequence rotated
+# to where each light starts, spacing the lights evenly around the loop.
+_CHASE_ROTATIONS = {
+    n: tuple(_CHASE_SEQ[i * (len(_CHASE_SEQ) // n):] +
+             _CHASE_SEQ[:i * (len(_CHASE_SEQ) // n)] for i in range(n))
+    for n in (1, 2, 3, 4)
+}
 
 
 # characters maps characters to the indices of the buttons that will
@@ -87,6 +129,27 @@ CHARACTERS = {
     'F': (4, 5, 6, 7, 13, 14, 15, 23)
 }
 
+# The light on messages needed to display each of the CHARACTERS, in
+# upper and lower case so `char_on` needn't normalise the case.
+_CHAR_MSGS = {c: tuple(_ON_MSG[BUTTONS[i].light] for i in indices)
+              for c, indices in CHARACTERS.items()}
+_CHAR_MSGS.update({c.lower(): v for c, v in _CHAR_MSGS.items()})
+
+
+def _sleep_until(deadline: float):
+    """
+    Sleep until `time.monotonic()` reaches deadline. Sleeping to a
+    deadline rather than for an interval stops overshoots accumulating
+    over an animation. The last half millisecond or so is spent
+    spinning because `time.sleep` can wake late.
+    :param deadline: The `time.monotonic()` value to wait for.
+    """
+    delay = deadline - time.monotonic()
+    if delay > 0.001:
+        time.sleep(delay - 0.0005)
+    while time.monotonic() < deadline:
+        pass
+
 
 class FaderPort(ABC):
     """
@@ -121,16 +184,32 @@ class FaderPort(ABC):
     There some methods for 'fancy' display effects, because why not?
     Check out: `countdown`, `snake`, `blink` and `chase`
 
+    By default the `on_...` methods are called straight from the MIDI
+    input callback, so a slow handler delays the messages behind it.
+    Pass `async_dispatch=True` to have the callback just queue each
+    message and call the handlers from a separate worker thread instead.
+    Either way `event_time` holds the `time.monotonic()` time at which
+    the message being handled arrived.
+
     **IMPORTANT NOTE** - There is a 'feature' in the FaderPort that can
     cause you some problems. If the 'Off' button is lit the fader will
     not send value updates when it's moved.
     """
 
-    def __init__(self):
+    __slots__ = ('inport', 'outport', 'async_dispatch', 'event_time',
+                 '_fader', '_msb', '_handle', '_queue', '_worker',
+                 '__weakref__')
+
+    def __init__(self, async_dispatch: bool = False):
         self.inport = None
         self.outport = None
+        self.async_dispatch = async_dispatch
+        self.event_time = 0.0
         self._fader = 0
         self._msb = 0
+        self._handle = None
+        self._queue = None
+        self._worker = None
 
     def __enter__(self):
         self.open()
@@ -148,17 +227,30 @@ class FaderPort(ABC):
                        I only have access to a single device so I can't
                        actually test this.
         """
-        self.inport = mido.open_input(find_faderport_input_name(number))
-        self.outport = mido.open_output(find_faderport_output_name(number))
+        self.inport, self.outport = _open_faderport_ports(number)
         self.outport.send(mido.Message.from_bytes([0x91, 0, 0x64]))  # A reset message???
         time.sleep(0.01)
-        self.inport.callback = self._message_callback
+        self._handle = self._make_handler()
+        if self.async_dispatch:
+            self._queue = queue.Queue()
+            self._worker = threading.Thread(target=self._drain, daemon=True)
+            self._worker.start()
+            self.inport.callback = self._enqueue
+        else:
+            self.inport.callback = self._handle
         self.on_open()
 
     def close(self):
         self.on_close()
         self.inport.callback = None
+        if self._worker:
+            self._queue.put(None)
+            if self._worker is not threading.current_thread():
+                self._worker.join()
+            self._worker = None
         self.fader = 0
+        # outport.reset() only sends "All Notes Off" and "Reset All
+        # Controllers", which don't affect the polytouch driven lights.
         self.all_off()
         self.outport.reset()
         self.inport.close()
@@ -174,23 +266,64 @@ class FaderPort(ABC):
         """Called when the FaderPort is closing."""
         pass
 
-    def _message_callback(self, msg):
-        """Callback function to handle incoming MIDI messages."""
-        if msg.type == 'polytouch':
-            button = button_from_press(msg.note)
-            if button:
-                self.on_button(button, msg.value != 0)
-            elif msg.note == 127:
-                self.on_fader_touch(msg.value != 0)
-        elif msg.type == 'control_change' and msg.control == 0:
-            self._msb = msg.value
-        elif msg.type == 'control_change' and msg.control == 32:
-            self._fader = (self._msb << 7 | msg.value) >> 4
-            self.on_fader(self._fader)
-        elif msg.type == 'pitchwheel':
-            self.on_rotary(1 if msg.pitch < 0 else -1)
-        else:
-            print('Unhandled:', msg)
+    def _enqueue(self, msg):
+        """Callback function to queue incoming MIDI messages."""
+        self._queue.put_nowait((time.monotonic(), msg))
+
+    def _drain(self):
+        """Worker thread to handle queued MIDI messages until closed."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            event_time, msg = item
+            try:
+                self._handle(msg, event_time)
+            except Exception:
+                log.exception('Error handling %s', msg)
+
+    def _make_handler(self):
+        """
+        Build the function that passes an incoming MIDI message on to the
+        `on_...` methods. The methods and the button lookup are bound here,
+        once per open, rather than looked up for every message.
+
+        The function is used as the MIDI input callback itself, in which
+        case it stamps `event_time` with the current time, or called by
+        the async worker with the time the message was queued.
+        """
+        on_button = self.on_button
+        on_fader_touch = self.on_fader_touch
+        on_fader = self.on_fader
+        on_rotary = self.on_rotary
+        buttons = _button_from_press
+        monotonic = time.monotonic
+
+        def handle(msg, event_time=None):
+            self.event_time = monotonic() if event_time is None else event_time
+            msg_type = msg.type
+            if msg_type == 'polytouch':
+                button = buttons[msg.note]
+                if button:
+                    on_button(button, msg.value != 0)
+                    return
+                if msg.note == 127:
+                    on_fader_touch(msg.value != 0)
+                    return
+            elif msg_type == 'control_change':
+                if msg.control == 0:
+                    self._msb = msg.value
+                    return
+                if msg.control == 32:
+                    self._fader = (self._msb << 7 | msg.value) >> 4
+                    on_fader(self._fader)
+                    return
+            elif msg_type == 'pitchwheel':
+                on_rotary(1 if msg.pitch < 0 else -1)
+                return
+            log.debug('Unhandled: %s', msg)
+
+        return handle
 
     @abstractmethod
     def on_rotary(self, direction: int):
@@ -232,36 +365,42 @@ class FaderPort(ABC):
 
     @fader.setter
     def fader(self, value: int):
-        """Move the fader to a new position in the range 0 to 1023."""
-        self._fader = int(value) if 0 < value < 1024 else 0
-        self.outport.send(mido.Message('control_change', control=0,
-                                       value=self._fader >> 7))
-        self.outport.send(mido.Message('control_change', control=32,
-                                       value=self._fader & 0x7F))
+        """Move the fader to a new position in the range 0 to 1023.
+
+        Values outside that range are clamped to the nearest end."""
+        self._fader = min(1023, max(0, int(value)))
+        self.outport.send(_FADER_MSB_MSG[self._fader >> 7])
+        self.outport.send(_FADER_LSB_MSG[self._fader & 0x7F])
 
     def light_on(self, button: Button):
         """Turn the light on for the given Button.
 
         NOTE! If yuo turn the "Off" button light on, the fader won't
         report value updates when it's moved."""
-        self.outport.send(mido.Message('polytouch', note=button.light, value=1))
+        self.outport.send(_ON_MSG.get(button.light) or
+                          mido.Message('polytouch', note=button.light, value=1))
 
     def light_off(self, button: Button):
         """Turn the light off for the given Button"""
-        self.outport.send(mido.Message('polytouch', note=button.light, value=0))
+        self.outport.send(_OFF_MSG.get(button.light) or
+                          mido.Message('polytouch', note=button.light, value=0))
+
+    def _send_all(self, messages):
+        """Send a batch of MIDI messages back to back."""
+        send = self.outport.send
+        for msg in messages:
+            send(msg)
 
     def all_off(self):
         """Turn all the button lights off."""
-        for button in BUTTONS:
-            self.light_off(button)
+        self._send_all(_ALL_OFF_MSGS)
 
     def all_on(self):
         """Turn all the button lights on.
 
         NOTE! The fader will not report value changes while the "Off"
         button is lit."""
-        for button in BUTTONS:
-            self.light_on(button)
+        self._send_all(_ALL_ON_MSGS)
 
     def snake(self, duration: float = 0.03):
         """
@@ -270,13 +409,17 @@ class FaderPort(ABC):
         with all lights off.
         :param duration: The duration to hold each individual button.
         """
-        for button in BUTTONS:
-            self.light_on(button)
-            time.sleep(duration)
-
-        for button in reversed(BUTTONS):
-            self.light_off(button)
-            time.sleep(duration)
+        send = self.outport.send
+        deadline = time.monotonic()
+        for msg in _ALL_ON_MSGS:
+            send(msg)
+            deadline += duration
+            _sleep_until(deadline)
+
+        for msg in reversed(_ALL_OFF_MSGS):
+            send(msg)
+            deadline += duration
+            _sleep_until(deadline)
 
     def blink(self, interval: float = 0.2, n: int = 3):
         """
@@ -287,31 +430,48 @@ class FaderPort(ABC):
         :param n: How many times to cycle ON and OFF
         :return:
         """
+        send_all = self._send_all
+        half = interval / 2
+        deadline = time.monotonic()
         for i in range(n):
-            self.all_on()
-            time.sleep(interval / 2)
-            self.all_off()
-            time.sleep(interval / 2)
+            send_all(_ALL_ON_MSGS)
+            deadline += half
+            _sleep_until(deadline)
+            send_all(_ALL_OFF_MSGS)
+            deadline += half
+            _sleep_until(deadline)
 
     def char_on(self, c):
         """
         Use button lights (as matrix) to display a hex character.
         :param c: String containing one of 0-9,A-F
         """
-        if c.upper() in CHARACTERS:
-            for i in CHARACTERS[c.upper()]:
-                self.light_on(BUTTONS[i])
+        msgs = _CHAR_MSGS.get(c)
+        if msgs is None:
+            # Not one of the pre-built characters, but it may have been
+            # added to CHARACTERS since.
+            indices = CHARACTERS.get(c.upper())
+            if indices is None:
+                return
+            msgs = tuple(_ON_MSG[BUTTONS[i].light] for i in indices)
+            _CHAR_MSGS[c] = msgs
+        self._send_all(msgs)
 
     def countdown(self, interval: float = 0.5):
         """
         Display a numeric countdown from 5
         :param interval: The interval in seconds for each number.
         """
+        on_time = interval * 0.66667
+        off_time = interval * 0.33333
+        deadline = time.monotonic()
         for c in '54321':
             self.char_on(c)
-            time.sleep(interval * 0.66667)
+            deadline += on_time
+            _sleep_until(deadline)
             self.all_off()
-            time.sleep(interval * 0.33333)
+            deadline += off_time
+            _sleep_until(deadline)
 
     def chase(self, duration: float = 0.08, num_lights: int = 2, ticks: int = 20):
         """
@@ -321,33 +481,16 @@ class FaderPort(ABC):
         :param num_lights: How many lights in the chase (1 to 4)
         :param ticks: How many chase steps.
         """
-        seq = [
-            button_from_name('Chan Down'),
-            button_from_name('Bank'),
-            button_from_name('Chan Up'),
-            button_from_name('Output'),
-            button_from_name('Off'),
-            button_from_name('Undo'),
-            button_from_name('Loop'),
-            button_from_name('User'),
-            button_from_name('Punch'),
-            button_from_name('Shift'),
-            button_from_name('Mix'),
-            button_from_name('Read'),
-        ]
-
-        num_lights = num_lights if num_lights in [1, 2, 3, 4] else 2
-
-        its = [cycle(seq) for _ in range(num_lights)]
-        for i, it in enumerate(its):
-            if i:
-                consume(it, i * (len(seq) // num_lights))
+        rotations = _CHASE_ROTATIONS.get(num_lights, _CHASE_ROTATIONS[2])
+        n = len(_CHASE_SEQ)
 
+        send = self.outport.send
+        deadline = time.monotonic()
         for x in range(ticks):
-            for it in its:
-                button = next(it)
-                self.light_on(button)
-            time.sleep(duration)
+            for seq in rotations:
+                send(_ON_MSG[seq[x % n].light])
+            deadline += duration
+            _sleep_until(deadline)
             self.all_off()
 
 
@@ -360,11 +503,7 @@ def find_faderport_input_name(number=0):
                    In which case 0 is the first, 1 is the second etc
     :return: Port name or None
     """
-    ins = [i for i in mido.get_input_names() if i.lower().startswith('faderport')]
-    if 0 <= number < len(ins):
-        return ins[number]
-    else:
-        return None
+    return _nth_faderport_name(mido.get_input_names(), number)
 
 
 def find_faderport_output_name(number=0):
@@ -376,21 +515,53 @@ def find_faderport_output_name(number=0):
                    In which case 0 is the first, 1 is the second etc
     :return: Port name or None
     """
-    outs = [i for i in mido.get_output_names() if i.lower().startswith('faderport')]
-    if 0 <= number < len(outs):
-        return outs[number]
-    else:
+    return _nth_faderport_name(mido.get_output_names(), number)
+
+
+def _nth_faderport_name(names, number):
+    """
+    Pick out the FaderPort port names and return the one at the given
+    position, stopping as soon as it's found.
+    :param names: MIDI port names.
+    :param number: 0 for the first FaderPort, 1 for the second etc
+    :return: Port name or None
+    """
+    if number < 0:
         return None
+    faderports = (i for i in names if i.lower().startswith('faderport'))
+    return next(islice(faderports, number, None), None)
+
+
+def _open_faderport_ports(number=0):
+    """
+    Open the MIDI input and output ports for a connected FaderPort.
+    :param number: 0 unless you've got more than one FaderPort attached.
+    :return: (input port, output port)
+    """
+    inport = mido.open_input(find_faderport_input_name(number))
+    try:
+        outport = mido.open_output(find_faderport_output_name(number))
+    except Exception:
+        inport.close()
+        raise
+    return inport, outport
 
 
 class TestFaderPort(FaderPort):
     """
     A class for testing the FaderPort functionality and demonstrating
     some of the possibilities.
+
+    It prints every event, so it uses `async_dispatch` to keep the
+    console output off the MIDI input thread. An exception in one of its
+    handlers is logged with its traceback and the next event is still
+    handled.
     """
 
+    __slots__ = ('_shift', 'cycling', 'should_exit')
+
     def __init__(self):
-        super().__init__()
+        super().__init__(async_dispatch=True)
         self._shift = False
         self.cycling = False
         self.should_exit = False